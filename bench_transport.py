@@ -0,0 +1,135 @@
+"""Send-throughput benchmark for the Telegram transport.
+
+Runs a fake Bot API server on localhost that answers every call after a fixed
+delay, then fans out sendMessage calls the way broadcast_to_groups does:
+once sequentially on a single connection (the old loop), then concurrently
+through the bulk pool, first without and then with the TG_BULK_RATE pacing
+that keeps real broadcasts under Telegram's flood limits. Usage:
+
+    python bench_transport.py [messages] [server_delay_ms]
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+
+import bot  # noqa: E402
+from telegram import Bot  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+
+
+def start_update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like api.telegram.org
+    wbufsize = -1  # send headers and body in one write
+    delay = 0.0
+    calls = None  # optional {method: multiprocessing.Value} counting calls across server processes
+    # Optional multiprocessing.Values set by the benchmark: getUpdates hands out /start updates 1..updates
+    # once getMe has been called ready_after times; first_update and last_send record wall-clock times
+    feed = None
+
+    def do_POST(self):
+        params = urllib.parse.parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        time.sleep(self.delay)
+        method = self.path.rsplit("/", 1)[-1]
+        counter = (self.calls or {}).get(method)
+        if counter is not None:
+            with counter.get_lock():
+                counter.value += 1
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            result = self.get_updates(int(params.get("offset", ["0"])[0]))
+        elif method in ("deleteWebhook", "setMyCommands"):
+            result = True
+        else:
+            if self.feed:
+                self.feed["last_send"].value = time.time()
+            result = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1, "type": "group"}}
+        body = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_updates(self, offset):
+        feed = self.feed
+        first = max(offset, 1)
+        if not feed or first > feed["updates"].value or self.calls["getMe"].value < feed["ready_after"].value:
+            time.sleep(0.1)  # stands in for the long poll
+            return []
+        if first == 1:
+            feed["first_update"].value = time.time()
+        last = min(first + 99, feed["updates"].value)
+        return [start_update(update_id, 1000 + update_id) for update_id in range(first, last + 1)]
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_server(delay, processes=1, calls=None, feed=None):
+    """Serve FakeBotAPI on a free localhost port from a thread, or from `processes` forked processes"""
+    FakeBotAPI.delay = delay
+    FakeBotAPI.calls = calls
+    FakeBotAPI.feed = feed
+    ThreadingHTTPServer.request_queue_size = 128  # the default backlog of 5 drops concurrent connects
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    server.daemon_threads = True
+    if processes == 1:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        fork = multiprocessing.get_context("fork")
+        for _ in range(processes):
+            fork.Process(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+async def run(label, port, request, concurrent, messages):
+    tg = Bot(os.environ["BOT_TOKEN"], base_url=f"http://127.0.0.1:{port}/bot", request=request)
+    async with tg:
+        started = time.perf_counter()
+        if concurrent:
+            await bot.fan_out(range(messages), lambda i: bot.send_bulk(tg, i, "bench"))
+        else:
+            for i in range(messages):
+                await tg.send_message(chat_id=i, text="bench")
+        elapsed = time.perf_counter() - started
+    print(f"{label:<28} {messages / elapsed:8.1f} msg/s  ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    SERVER_DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    port = start_fake_server(SERVER_DELAY)
+
+    print(f"{MESSAGES} messages, {SERVER_DELAY * 1000:.0f}ms server delay, bulk pool {bot.TG_POOL_BULK}")
+    asyncio.run(run("sequential, 1 connection", port, HTTPXRequest(connection_pool_size=1), False, MESSAGES))
+    routed, _ = bot.build_transport()
+    paced_rate = bot.BULK_RATE_LIMITER.rate
+    bot.BULK_RATE_LIMITER.rate = 0
+    asyncio.run(run("concurrent, bulk pool", port, routed, True, MESSAGES))
+    bot.BULK_RATE_LIMITER.rate = paced_rate
+    asyncio.run(run(f"concurrent, paced {paced_rate:g}/s", port, routed, True, MESSAGES))
+    for metrics in bot.transport_metrics():
+        print(metrics)
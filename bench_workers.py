@@ -0,0 +1,94 @@
+"""Update-throughput benchmark for worker mode.
+
+Runs the bot itself (`python bot.py`) with WORKERS=K against a fake Bot API
+whose getUpdates hands out synthetic /start updates from distinct users. It
+times from the first batch being polled to the last reply, so the ingest's
+cost per update (getUpdates parsing, process_update, to_dict and pickling onto
+a worker queue) is included along with the workers' handling. Updates are held
+back until every worker has started. Usage:
+
+    python bench_workers.py [updates] [max_workers]
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_transport import start_fake_server
+
+BOT_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(counter, target, process, log_path, timeout=300):
+    deadline = time.time() + timeout
+    while counter.value < target:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"bot exited with {process.returncode} after {counter.value}/{target} replies, see {log_path}"
+            )
+        if time.time() > deadline:
+            raise TimeoutError(f"{counter.value}/{target} replies after {timeout}s, see {log_path}")
+        time.sleep(0.01)
+
+
+def run(workers, updates, api_port, calls, feed):
+    for value in list(calls.values()) + list(feed.values()):
+        value.value = 0
+    feed["updates"].value = updates
+    # The ingest and every worker call getMe once while starting up
+    feed["ready_after"].value = workers + 1 if workers > 1 else 1
+
+    web_port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:bench",
+        WORKERS=str(workers),
+        TG_BASE_URL=f"http://127.0.0.1:{api_port}/bot",
+        PORT=str(web_port),
+        RENDER_APP_URL=f"http://127.0.0.1:{web_port}",
+        LOG_LEVEL="WARNING",
+    )
+    env.pop("BOTS_CONFIG", None)
+    workdir = tempfile.mkdtemp(prefix="bench-workers-")
+    output = open(os.path.join(workdir, "bot.log"), "wb")
+    process = subprocess.Popen([sys.executable, BOT_PY], cwd=workdir, env=env, stdout=output, stderr=output)
+    try:
+        wait_for(calls["sendMessage"], updates, process, output.name)
+        elapsed = feed["last_send"].value - feed["first_update"].value
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=60)
+        output.close()
+    return updates / elapsed
+
+
+if __name__ == "__main__":
+    UPDATES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    MAX_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    calls = {method: multiprocessing.Value("i", 0) for method in ("getMe", "sendMessage")}
+    feed = {
+        "updates": multiprocessing.Value("i", 0),
+        "ready_after": multiprocessing.Value("i", 0),
+        "first_update": multiprocessing.Value("d", 0),
+        "last_send": multiprocessing.Value("d", 0),
+    }
+    port = start_fake_server(0.0, processes=MAX_WORKERS, calls=calls, feed=feed)
+
+    print(f"{UPDATES} updates, {os.cpu_count()} CPUs, state backend {os.environ.get('STATE_BACKEND', 'sqlite')}")
+    baseline = None
+    workers = 1
+    while workers <= MAX_WORKERS:
+        rate = run(workers, UPDATES, port, calls, feed)
+        baseline = baseline or rate
+        print(f"{workers} worker(s)  {rate:8.1f} updates/s  x{rate / baseline:.2f}")
+        workers *= 2
@@ -1,22 +1,44 @@
+import time
+# Reference point for the cold-start report; taken before the heavy imports below
+PROCESS_START = time.perf_counter()
+
 import os
+import io
+import sys
+import html
+import json
+import asyncio
+import atexit
+import contextvars
+import copy
+import importlib.util
+import logging
+import logging.handlers
+import queue
+import re
+import signal
 import sqlite3
 import threading
-import time
-import requests
-from flask import Flask, request
+import weakref
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
+    TypeHandler,
 )
 from telegram.constants import ChatType, ParseMode
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import BaseRequest, HTTPXRequest
+from collections import Counter, OrderedDict, deque
 
 # ---------------- CONFIG ----------------
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
-if not BOT_TOKEN:
+# Optional JSON file describing several bots (tenants) to host in this one process
+BOTS_CONFIG = os.environ.get("BOTS_CONFIG")
+if not BOT_TOKEN and not BOTS_CONFIG:
     raise ValueError("BOT_TOKEN environment variable is required. Please set it in Render dashboard.")
 
 # Your Telegram user ID (Morris/Morrynet @MCAIGold)
@@ -24,62 +46,592 @@ ADMIN_IDS = {8038790386}  # Morris's Telegram ID
 
 DB_FILE = "bot.db"
 COOLDOWN = 10  # seconds for anti-spam
-LAST_ACTION = {}
-LAST_ACTION_LOCK = threading.Lock()
+
+# Scale-out: with WORKERS > 1 this process only polls and routes updates by user to worker processes
+WORKERS = int(os.environ.get("WORKERS", 1))
+# Where cooldowns, cache versions and the broadcast queue live: "memory" (this process only),
+# "sqlite" (STATE_DB in WAL mode) or "manager" (a local state server standing in for a network store)
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "sqlite" if WORKERS > 1 else "memory")
+STATE_DB = os.environ.get("STATE_DB", "state.db")
+STATE_ADDRESS = os.environ.get("STATE_ADDRESS", "127.0.0.1:0")
+BROADCAST_POLL_INTERVAL = 0.5  # seconds between broadcast queue checks when it is empty
 
 # Your Render app URL
 RENDER_APP_URL = os.environ.get("RENDER_APP_URL", "https://viral-music-bot-2.onrender.com")
 
+# Logging: level and the window (seconds) in which repeats of the same event collapse into a count
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_WINDOW = float(os.environ.get("LOG_SAMPLE_WINDOW", 30))
+
+# Updates slower than this (milliseconds) are recorded with their DB / Telegram API breakdown
+SLOW_UPDATE_MS = float(os.environ.get("SLOW_UPDATE_MS", 1000))
+PROFILE_MAX_SECONDS = 120
+PROFILE_INTERVAL = 0.005  # seconds between profiler samples
+
+# Start the keep-alive web server and pinger after the first update, or after this many seconds
+COLD_START_DEFER = float(os.environ.get("COLD_START_DEFER", 5))
+USER_CACHE_SIZE = 1000  # most recently seen users kept in memory (and in the warm-start snapshot)
+QUIZ_PROGRESS_SIZE = 10000  # users with a quiz in progress; the oldest start over when exceeded
+# Quiz attempts are written in batches of this many rows, or every ATTEMPT_FLUSH_INTERVAL seconds
+ATTEMPT_BATCH_SIZE = 100
+ATTEMPT_FLUSH_INTERVAL = 2.0
+
+# Telegram transport: keep-alive pool sizes for getUpdates, replies and bulk sends (broadcasts)
+TG_POOL_UPDATES = int(os.environ.get("TG_POOL_UPDATES", 1))
+TG_POOL_REPLIES = int(os.environ.get("TG_POOL_REPLIES", 32))
+TG_POOL_BULK = int(os.environ.get("TG_POOL_BULK", 16))
+TG_HTTP2 = os.environ.get("TG_HTTP2", "0") == "1"
+# Bulk send pacing per bot, under Telegram's flood limits (about 30 messages/s overall, 20/min to one
+# group, 1/s to one private chat). Split between worker processes; 0 disables the overall limit.
+TG_BULK_RATE = float(os.environ.get("TG_BULK_RATE", 25))
+TG_GROUP_RATE = 20  # messages per minute to one group
+TG_BULK_RETRIES = 3  # flood-control RetryAfter retries per message
+TG_CONNECT_TIMEOUT = float(os.environ.get("TG_CONNECT_TIMEOUT", 5))
+TG_POOL_TIMEOUT = float(os.environ.get("TG_POOL_TIMEOUT", 5))
+TG_BASE_URL = os.environ.get("TG_BASE_URL", "https://api.telegram.org/bot")
+# Read timeouts per Bot API method, e.g. "sendMessage=5,sendDocument=60"
+TG_METHOD_TIMEOUTS = {"sendMessage": 10.0, "sendDocument": 60.0, "getChatMember": 5.0}
+TG_METHOD_TIMEOUTS.update(
+    (name.strip(), float(value))
+    for name, value in (
+        item.split("=", 1) for item in os.environ.get("TG_METHOD_TIMEOUTS", "").split(",") if "=" in item
+    )
+)
+
 SONGS = {
     "song1": {
         "title": "Tribute to Dear Mama",
         "url": "https://youtu.be/gbprHnumaBM?si=R5ocaU_avNf7J4n2",
-        "answer": "mama"
     },
     "song2": {
         "title": "Tribute to Nannies & Teachers",
         "url": "https://youtu.be/L8hiNjTcvDY?si=8uOj46Cohj2bylzk",
-        "answer": "teachers"
     }
 }
 
-# ---------------- DATABASE ----------------
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            reward_unlocked INTEGER DEFAULT 0,
-            shares_left INTEGER DEFAULT 0,
-            quizzes_passed INTEGER DEFAULT 0,
-            promotions_used INTEGER DEFAULT 0
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS approved_groups (
-            chat_id INTEGER PRIMARY KEY,
-            added_by INTEGER,
-            title TEXT,
-            username TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS group_broadcasts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER,
-            link TEXT,
-            promoted_by INTEGER,
-            broadcast_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (chat_id) REFERENCES approved_groups(chat_id)
+# ---------------- TENANTS ----------------
+class Tenant:
+    """One hosted bot: its token, admins, songs, its own database file and its read caches"""
+
+    def __init__(self, name, token, admin_ids, songs, db_file):
+        self.name = name
+        self.token = token
+        self.admin_ids = set(admin_ids)
+        self.songs = songs
+        self.db_file = db_file
+        # kind -> (version, value); see cached()
+        self.cache = {}
+        self.users = OrderedDict()
+        self.user_versions = {}  # shard -> version the cached users of that shard belong to
+        # Set by load_quiz() at startup
+        self.quiz = None
+        self.attempts = None
+        # user_id -> id of the question they have to answer next; each user is handled by one process
+        self.quiz_progress = OrderedDict()
+
+# The single bot configured through BOT_TOKEN and the constants above
+DEFAULT_TENANT = Tenant("default", BOT_TOKEN, ADMIN_IDS, SONGS, DB_FILE)
+# Tenant of the update being processed; set by InstrumentedApplication
+CURRENT_TENANT = contextvars.ContextVar("current_tenant", default=DEFAULT_TENANT)
+TENANTS = [DEFAULT_TENANT]
+
+def load_tenants(path):
+    """Read tenants from a JSON config file.
+
+    Format: {"db_dir": "data", "bots": [{"name": "mama", "token_env": "MAMA_BOT_TOKEN",
+    "admin_ids": [123], "songs": {...}}]}. "token" may be given inline instead of
+    "token_env"; "songs" defaults to SONGS. "admin_ids" is required. Each bot
+    gets <db_dir>/<name>.db, so names are limited to letters, digits, "_" and "-".
+    """
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    db_dir = config.get("db_dir", ".")
+    os.makedirs(db_dir, exist_ok=True)
+    tenants = []
+    for entry in config["bots"]:
+        name = entry["name"]
+        if not isinstance(name, str) or not re.fullmatch(r"[A-Za-z0-9_-]+", name):
+            raise ValueError(f"Bot name {name!r} in {path} must contain only letters, digits, '_' and '-'")
+        token = entry.get("token") or os.environ.get(entry.get("token_env", ""))
+        if not token:
+            raise ValueError(f"No token configured for bot '{name}' in {path}")
+        admin_ids = entry.get("admin_ids")
+        if not isinstance(admin_ids, list) or not all(isinstance(i, int) for i in admin_ids):
+            raise ValueError(f"Bot '{name}' in {path} needs \"admin_ids\": a list of Telegram user IDs")
+        tenants.append(Tenant(
+            name,
+            token,
+            admin_ids,
+            entry.get("songs", SONGS),
+            os.path.join(db_dir, f"{name}.db"),
+        ))
+    if len({t.name for t in tenants}) != len(tenants):
+        raise ValueError(f"Bot names in {path} must be unique")
+    return tenants
+
+def for_each_tenant(func):
+    """Call func() in the context of every hosted tenant and return the results"""
+    results = []
+    for tenant in TENANTS:
+        token = CURRENT_TENANT.set(tenant)
+        try:
+            results.append(func())
+        finally:
+            CURRENT_TENANT.reset(token)
+    return results
+
+# ---------------- LOGGING ----------------
+log = logging.getLogger("viral_music_bot")
+
+# Structured fields handlers may pass through `extra=`
+LOG_FIELDS = (
+    "tenant", "worker", "user_id", "chat_id", "command", "handler", "latency_ms", "db_ms", "api_ms",
+    "status", "error", "sent", "failed", "admins", "url", "workers", "interval_s", "db_file", "version",
+    "phases",
+)
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as a single JSON line"""
+
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """Let one warning/error per (logger, event, command, exception type) through every `window` seconds.
+
+    Repeats inside the window are dropped and counted; the count is attached
+    as `suppressed` to the next record of that event that gets through.
+    Records below WARNING are never sampled. Counts still pending when no
+    later record arrives are reported by `flush()`.
+    """
+
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self._seen = {}  # (logger, msg, levelno, command, exception type) -> [last_emit, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.window <= 0 or record.levelno < logging.WARNING or getattr(record, "summary", False):
+            return True
+        # Different exceptions logged under one message (e.g. PTB's unhandled-error line) are separate events
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.msg, record.levelno, getattr(record, "command", None), exc_type)
+        now = record.created
+        with self._lock:
+            state = self._seen.get(key)
+            if state and now - state[0] < self.window:
+                state[1] += 1
+                return False
+            record.suppressed = state[1] if state else 0
+            self._seen[key] = [now, 0]
+        return True
+
+    def flush(self):
+        """Log one summary record per event that still has suppressed repeats"""
+        with self._lock:
+            pending = [(key, state[1]) for key, state in self._seen.items() if state[1]]
+            for key, _ in pending:
+                self._seen[key][1] = 0
+        for (name, msg, levelno, command, exc_type), count in pending:
+            logging.getLogger(name).log(levelno, msg, extra={
+                "command": command, "error": exc_type, "suppressed": count, "summary": True,
+            })
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps records structured for the JSON formatter.
+
+    The stock prepare() merges args into msg and drops exc_info without
+    rendering it; here the traceback is rendered into exc_text first.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class TenantFilter(logging.Filter):
+    """Stamp records with the tenant of the update being handled (the listener thread can't see it)
+    and, in a worker process, the worker index"""
+
+    def filter(self, record):
+        if not hasattr(record, "tenant"):
+            tenant = CURRENT_TENANT.get()
+            record.tenant = tenant.name if tenant is not DEFAULT_TENANT else None
+        record.worker = WORKER_INDEX
+        return True
+
+def setup_logging():
+    """Route logs through a queue so the event loop never blocks on stdout.
+
+    Records are formatted and written by a QueueListener on a background thread.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    rate_limit = RateLimitFilter(LOG_SAMPLE_WINDOW)
+    queue_handler.addFilter(TenantFilter())
+    queue_handler.addFilter(rate_limit)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # Library chatter (httpx request lines, werkzeug access log) is noise at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    if LOG_SAMPLE_WINDOW > 0:
+        # Registered after listener.stop so it runs first at exit, while the listener still drains
+        atexit.register(rate_limit.flush)
+        threading.Thread(target=flush_suppressed, args=(rate_limit,), daemon=True).start()
+    return listener
+
+def flush_suppressed(rate_limit):
+    while True:
+        time.sleep(LOG_SAMPLE_WINDOW)
+        rate_limit.flush()
+
+# ---------------- STATE BACKEND ----------------
+class MemoryStateBackend:
+    """Cooldowns, counters and queues in this process's memory"""
+
+    def __init__(self):
+        self._cooldowns = {}
+        self._counters = {}
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key, ttl):
+        """Start a `ttl`-second cooldown on `key`; False if one is still running"""
+        now = time.time()
+        with self._lock:
+            if now - self._cooldowns.get(key, 0) < ttl:
+                return False
+            self._cooldowns[key] = now
+        return True
+
+    def get(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters[key] = self._counters.get(key, 0) + 1
+        return value
+
+    def push(self, queue_name, item):
+        with self._lock:
+            self._queues.setdefault(queue_name, deque()).append(item)
+
+    def pop(self, queue_name):
+        """Oldest item of the queue, or None when it is empty"""
+        with self._lock:
+            items = self._queues.get(queue_name)
+            return items.popleft() if items else None
+
+class SqliteStateBackend:
+    """The same operations on a SQLite database in WAL mode, shared by every process on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cooldowns (key TEXT PRIMARY KEY, at REAL);
+            CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS queue_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue_name TEXT,
+                item TEXT
+            );
+        """)
+
+    def _conn(self):
+        # One autocommit connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def try_acquire(self, key, ttl):
+        now = time.time()
+        cursor = self._conn().execute("""
+            INSERT INTO cooldowns (key, at) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET at = excluded.at WHERE cooldowns.at <= ?
+        """, (key, now, now - ttl))
+        return cursor.rowcount > 0
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value FROM counters WHERE key=?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT INTO counters (key, value) VALUES (?, 1)
+                ON CONFLICT(key) DO UPDATE SET value = value + 1
+            """, (key,))
+            value = conn.execute("SELECT value FROM counters WHERE key=?", (key,)).fetchone()[0]
+        finally:
+            conn.execute("COMMIT")
+        return value
+
+    def push(self, queue_name, item):
+        self._conn().execute(
+            "INSERT INTO queue_items (queue_name, item) VALUES (?, ?)", (queue_name, json.dumps(item))
         )
-    """)
+
+    def pop(self, queue_name):
+        conn = self._conn()
+        query = "SELECT id, item FROM queue_items WHERE queue_name=? ORDER BY id LIMIT 1"
+        # Every worker polls this; an empty queue must not take the write lock
+        if conn.execute(query, (queue_name,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have taken the item since the unlocked read
+            row = conn.execute(query, (queue_name,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM queue_items WHERE id=?", (row[0],))
+        finally:
+            conn.execute("COMMIT")
+        return json.loads(row[1]) if row else None
+
+_SERVED_STATE = None
+_STATE_MANAGER = None
+
+def served_state():
+    global _SERVED_STATE
+    if _SERVED_STATE is None:
+        _SERVED_STATE = MemoryStateBackend()
+    return _SERVED_STATE
+
+def state_manager_class():
+    """The StateManager class, defined on first use; multiprocessing.managers is slow to import
+    and only STATE_BACKEND=manager needs it"""
+    global _STATE_MANAGER
+    if _STATE_MANAGER is None:
+        from multiprocessing.managers import BaseManager
+
+        class StateManager(BaseManager):
+            """Serves one MemoryStateBackend over a socket; the local stand-in for a network store"""
+
+        # Pickled by name when the server process is spawned; see __getattr__ below
+        StateManager.__qualname__ = "StateManager"
+        StateManager.register("state", callable=served_state)
+        _STATE_MANAGER = StateManager
+    return _STATE_MANAGER
+
+def __getattr__(name):
+    # Lets a spawned process unpickle bot.StateManager before anything defined it there
+    if name == "StateManager":
+        return state_manager_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def open_state_backend(spec):
+    """Build the backend described by `spec`: ("memory",), ("sqlite", path) or ("manager", address, authkey)"""
+    kind = spec[0]
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SqliteStateBackend(spec[1])
+    if kind == "manager":
+        manager = state_manager_class()(address=spec[1], authkey=spec[2])
+        manager.connect()
+        return manager.state()
+    raise ValueError(f"Unknown STATE_BACKEND '{kind}'")
+
+STATE = MemoryStateBackend()
+# Index of this worker process, None outside worker mode
+WORKER_INDEX = None
+
+def user_shard(user_id):
+    return user_id % WORKERS
+
+# ---------------- DATABASE ----------------
+def _timed_db(method):
+    """Wrap a sqlite3 method so its time is charged to the update being processed"""
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            add_update_time("db", started)
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that charges query and row-fetch time to the update being processed"""
+    execute = _timed_db(sqlite3.Cursor.execute)
+    executemany = _timed_db(sqlite3.Cursor.executemany)
+    fetchone = _timed_db(sqlite3.Cursor.fetchone)
+    fetchmany = _timed_db(sqlite3.Cursor.fetchmany)
+    fetchall = _timed_db(sqlite3.Cursor.fetchall)
+    __next__ = _timed_db(sqlite3.Cursor.__next__)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts bypass cursor(), so route them through it
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    commit = _timed_db(sqlite3.Connection.commit)
+
+def db_connect():
+    return sqlite3.connect(CURRENT_TENANT.get().db_file, factory=TimedConnection)
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        reward_unlocked INTEGER DEFAULT 0,
+        shares_left INTEGER DEFAULT 0,
+        quizzes_passed INTEGER DEFAULT 0,
+        promotions_used INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS approved_groups (
+        chat_id INTEGER PRIMARY KEY,
+        added_by INTEGER,
+        title TEXT,
+        username TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS group_broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        link TEXT,
+        promoted_by INTEGER,
+        broadcast_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES approved_groups(chat_id)
+    );
+    """,
+    # Quiz questions per song (song_key NULL: about all songs); seed_quiz() adds the first one
+    """
+    CREATE TABLE IF NOT EXISTS quiz_questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        song_key TEXT,
+        position INTEGER DEFAULT 0,
+        prompt TEXT
+    );
+    CREATE TABLE IF NOT EXISTS quiz_options (
+        question_id INTEGER,
+        position INTEGER,
+        label TEXT,
+        correct INTEGER DEFAULT 0,
+        PRIMARY KEY (question_id, position),
+        FOREIGN KEY (question_id) REFERENCES quiz_questions(id)
+    );
+    CREATE TABLE IF NOT EXISTS quiz_attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        question_id INTEGER,
+        option_index INTEGER,
+        correct INTEGER,
+        attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+]
+
+# Wrong option of the seeded question, next to one correct option per song
+QUIZ_DECOY = "Just a Party Song 🎉"
+
+def seed_quiz(conn):
+    """Add the tenant's first question, "What are the songs mainly about?", built from its song titles"""
+    titles = [song["title"] for song in CURRENT_TENANT.get().songs.values()]
+    cursor = conn.execute(
+        "INSERT INTO quiz_questions (song_key, position, prompt) VALUES (NULL, 1, 'What are the songs mainly about?')"
+    )
+    conn.executemany(
+        "INSERT INTO quiz_options (question_id, position, label, correct) VALUES (?, ?, ?, ?)",
+        [(cursor.lastrowid, i, title, 1) for i, title in enumerate(titles)]
+        + [(cursor.lastrowid, len(titles), QUIZ_DECOY, 0)],
+    )
     conn.commit()
+
+def migrate_db():
+    """Bring the schema up to date; a read of user_version and nothing else when it already is"""
+    conn = db_connect()
+    if WORKERS > 1:
+        # Workers write concurrently; WAL lets readers carry on during a write
+        conn.execute("PRAGMA journal_mode=WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, script in enumerate(MIGRATIONS[version:], version + 1):
+        conn.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+        log.info("db_migrated", extra={"db_file": CURRENT_TENANT.get().db_file, "version": number})
+    if version < 2:
+        # The quiz tables were just created
+        seed_quiz(conn)
     conn.close()
 
+def cache_key(kind):
+    return f"{CURRENT_TENANT.get().name}:{kind}"
+
+def cached(kind, load):
+    """Return the tenant's cached `kind`, reloading it when missing or changed by any process.
+
+    Every write bumps the kind's version in STATE (see invalidate()), so worker
+    processes see each other's changes.
+    """
+    tenant = CURRENT_TENANT.get()
+    version = STATE.get(cache_key(kind))
+    entry = tenant.cache.get(kind)
+    if entry is None or entry[0] != version:
+        entry = tenant.cache[kind] = (version, load())
+    return entry[1]
+
+def invalidate(kind):
+    CURRENT_TENANT.get().cache.pop(kind, None)
+    return STATE.incr(cache_key(kind))
+
 def get_user(user_id):
-    conn = sqlite3.connect(DB_FILE)
+    tenant = CURRENT_TENANT.get()
+    users = tenant.users
+    shard = user_shard(user_id)
+    version = STATE.get(cache_key(f"users:{shard}"))
+    if tenant.user_versions.get(shard) != version:
+        for uid in [uid for uid in users if user_shard(uid) == shard]:
+            del users[uid]
+        tenant.user_versions[shard] = version
+    row = users.get(user_id)
+    if row is not None:
+        users.move_to_end(user_id)
+        return row
+    conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
     row = c.fetchone()
@@ -87,11 +639,26 @@ def get_user(user_id):
         c.execute("INSERT INTO users (user_id) VALUES (?)", (user_id,))
         conn.commit()
         row = (user_id, 0, 0, 0, 0)
+        invalidate("leaderboard")
     conn.close()
+    users[user_id] = row
+    if len(users) > USER_CACHE_SIZE:
+        users.popitem(last=False)
     return row
 
+def forget_user(user_id):
+    """Drop cached state derived from a user's row after it was written"""
+    tenant = CURRENT_TENANT.get()
+    tenant.users.pop(user_id, None)
+    shard = user_shard(user_id)
+    version = STATE.incr(cache_key(f"users:{shard}"))
+    # Nobody else wrote in between, so the rest of our cached users are still current
+    if tenant.user_versions.get(shard) == version - 1:
+        tenant.user_versions[shard] = version
+    invalidate("leaderboard")
+
 def unlock_reward(user_id):
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute(
         "UPDATE users SET reward_unlocked=1, shares_left=20, quizzes_passed=1 WHERE user_id=?",
@@ -99,9 +666,10 @@ def unlock_reward(user_id):
     )
     conn.commit()
     conn.close()
+    forget_user(user_id)
 
 def reduce_share(user_id):
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute(
         "UPDATE users SET shares_left = shares_left - 1, promotions_used = promotions_used + 1 WHERE user_id=? AND shares_left > 0",
@@ -110,10 +678,11 @@ def reduce_share(user_id):
     affected = c.rowcount
     conn.commit()
     conn.close()
+    forget_user(user_id)
     return affected > 0
 
 def register_group(chat_id, added_by, title, username=None):
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("""
         INSERT OR REPLACE INTO approved_groups (chat_id, added_by, title, username) 
@@ -121,17 +690,35 @@ def register_group(chat_id, added_by, title, username=None):
     """, (chat_id, added_by, title, username))
     conn.commit()
     conn.close()
+    invalidate("groups")
 
 def get_approved_groups():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT chat_id, title, username FROM approved_groups")
-    groups = c.fetchall()
-    conn.close()
-    return groups
+    def load():
+        conn = db_connect()
+        c = conn.cursor()
+        c.execute("SELECT chat_id, title, username FROM approved_groups")
+        groups = c.fetchall()
+        conn.close()
+        return groups
+    return cached("groups", load)
+
+def get_leaderboard():
+    def load():
+        conn = db_connect()
+        c = conn.cursor()
+        c.execute("""
+            SELECT user_id, quizzes_passed, promotions_used
+            FROM users
+            ORDER BY quizzes_passed DESC, promotions_used DESC
+            LIMIT 10
+        """)
+        rows = c.fetchall()
+        conn.close()
+        return rows
+    return cached("leaderboard", load)
 
 def log_broadcast(chat_id, link, promoted_by):
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("""
         INSERT INTO group_broadcasts (chat_id, link, promoted_by) 
@@ -141,7 +728,7 @@ def log_broadcast(chat_id, link, promoted_by):
     conn.close()
 
 def get_group_stats():
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("""
         SELECT 
@@ -157,40 +744,529 @@ def get_group_stats():
     conn.close()
     return stats
 
+class BatchWriter:
+    """Buffers rows for one INSERT statement and writes them from a background thread.
+
+    Rows are flushed in a single transaction once `batch_size` are waiting or
+    every `interval` seconds, and on close() (registered with atexit).
+    """
+
+    def __init__(self, db_file, sql, batch_size, interval):
+        self.db_file = db_file
+        self.sql = sql
+        self.batch_size = batch_size
+        self.interval = interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_size:
+                self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with conn:
+                conn.executemany(self.sql, rows)
+        except sqlite3.Error as e:
+            log.error("batch_write_failed", extra={"error": str(e), "failed": len(rows)})
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+# ---------------- WARM START ----------------
+def snapshot_file():
+    return CURRENT_TENANT.get().db_file + ".snapshot.json"
+
+def db_fingerprint():
+    """mtimes of the database and its WAL file; any committed write changes one of them"""
+    db_file = CURRENT_TENANT.get().db_file
+    wal_file = db_file + "-wal"
+    return [
+        os.stat(db_file).st_mtime_ns,
+        os.stat(wal_file).st_mtime_ns if os.path.exists(wal_file) else 0,
+    ]
+
+def save_snapshot():
+    """Write the tenant's caches next to its database so the next start begins warm"""
+    tenant = CURRENT_TENANT.get()
+    snapshot = {
+        "db_fingerprint": db_fingerprint(),
+        "groups": get_approved_groups(),
+        "leaderboard": get_leaderboard(),
+        "users": list(tenant.users.values()),
+    }
+    tmp_file = snapshot_file() + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_file, snapshot_file())
+
+def restore_snapshot():
+    """Load caches saved by save_snapshot(), unless the database changed since it was written"""
+    tenant = CURRENT_TENANT.get()
+    try:
+        with open(snapshot_file(), encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if snapshot.get("db_fingerprint") != db_fingerprint():
+        return False
+    tenant.cache["groups"] = (STATE.get(cache_key("groups")), [tuple(row) for row in snapshot["groups"]])
+    tenant.cache["leaderboard"] = (
+        STATE.get(cache_key("leaderboard")), [tuple(row) for row in snapshot["leaderboard"]]
+    )
+    tenant.users = OrderedDict((row[0], tuple(row)) for row in snapshot["users"])
+    tenant.user_versions = {0: STATE.get(cache_key("users:0"))}
+    return True
+
+# ---------------- QUIZ ENGINE ----------------
+QUIZ_CALLBACK_PREFIX = "qz"
+# Buttons of quiz messages sent before the quiz moved to the database, as (question id, option index)
+LEGACY_QUIZ_CALLBACKS = {"q1_mama": (1, 0), "q1_teachers": (1, 1), "wrong": (1, 2)}
+
+class QuizQuestion:
+    def __init__(self, question_id, prompt, options, correct):
+        self.id = question_id
+        self.prompt = prompt
+        self.options = options  # button labels, in order
+        self.correct = correct  # frozenset of correct option indexes
+        self.number = 1  # 1-based position in the quiz
+        self.next_id = None  # following question of the quiz, None for the last one
+
+class Quiz:
+    """A tenant's questions indexed by id, in the order they are asked"""
+
+    def __init__(self, questions):
+        self.questions = {question.id: question for question in questions}
+        self.first_id = questions[0].id if questions else None
+        for number, question in enumerate(questions, 1):
+            question.number = number
+        for question, following in zip(questions, questions[1:]):
+            question.next_id = following.id
+
+    def __len__(self):
+        return len(self.questions)
+
+def load_quiz():
+    """Read the tenant's quiz into memory and start its attempt writer; run once at startup"""
+    tenant = CURRENT_TENANT.get()
+    conn = db_connect()
+    c = conn.cursor()
+    c.execute("SELECT id, song_key, prompt FROM quiz_questions ORDER BY position, id")
+    rows = c.fetchall()
+    c.execute("SELECT question_id, label, correct FROM quiz_options ORDER BY question_id, position")
+    options = {}
+    for question_id, label, correct in c.fetchall():
+        labels, correct_indexes = options.setdefault(question_id, ([], set()))
+        if correct:
+            correct_indexes.add(len(labels))
+        labels.append(label)
+    conn.close()
+
+    # General questions first, then per song in the tenant's song order; other songs' questions are skipped
+    song_order = {key: i for i, key in enumerate(tenant.songs)}
+    rows = [row for row in rows if row[0] in options and (row[1] is None or row[1] in song_order)]
+    for question_id, song_key, prompt in rows:
+        if not options[question_id][1]:
+            # Nobody could get past it
+            log.warning("quiz_question_skipped", extra={"error": f"question {question_id} has no correct option"})
+    rows = [row for row in rows if options[row[0]][1]]
+    rows.sort(key=lambda row: -1 if row[1] is None else song_order[row[1]])
+    tenant.quiz = Quiz([
+        QuizQuestion(question_id, prompt, options[question_id][0], frozenset(options[question_id][1]))
+        for question_id, song_key, prompt in rows
+    ])
+    if tenant.attempts is None:
+        tenant.attempts = BatchWriter(
+            tenant.db_file,
+            "INSERT INTO quiz_attempts (user_id, question_id, option_index, correct) VALUES (?, ?, ?, ?)",
+            ATTEMPT_BATCH_SIZE,
+            ATTEMPT_FLUSH_INTERVAL,
+        )
+
+def quiz_callback(question_id, option_index):
+    """callback_data for an answer button: "qz:<question id>:<option index>", far below Telegram's 64 bytes"""
+    return f"{QUIZ_CALLBACK_PREFIX}:{question_id}:{option_index}"
+
+def parse_quiz_callback(data):
+    """(question id, option index) for an answer button's callback_data, or None if malformed"""
+    if data in LEGACY_QUIZ_CALLBACKS:
+        return LEGACY_QUIZ_CALLBACKS[data]
+    try:
+        prefix, question_id, option_index = data.split(":")
+        if prefix != QUIZ_CALLBACK_PREFIX:
+            return None
+        return int(question_id), int(option_index)
+    except ValueError:
+        return None
+
+def set_quiz_progress(user_id, question_id):
+    """Remember the question `user_id` answers next, or forget them once `question_id` is None"""
+    progress = CURRENT_TENANT.get().quiz_progress
+    progress.pop(user_id, None)
+    if question_id is not None:
+        progress[user_id] = question_id
+        if len(progress) > QUIZ_PROGRESS_SIZE:
+            progress.popitem(last=False)
+
+def quiz_keyboard(question):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(label, callback_data=quiz_callback(question.id, i))]
+        for i, label in enumerate(question.options)
+    ])
+
 # ---------------- ANTI-SPAM ----------------
 def is_spamming(user_id):
-    now = time.time()
-    with LAST_ACTION_LOCK:
-        last = LAST_ACTION.get(user_id, 0)
-        if now - last < COOLDOWN:
-            return True
-        LAST_ACTION[user_id] = now
-    return False
+    return not STATE.try_acquire(cache_key(f"cooldown:{user_id}"), COOLDOWN)
 
 # ---------------- ADMIN CHECK ----------------
 def is_admin(user_id):
-    return user_id in ADMIN_IDS
+    return user_id in CURRENT_TENANT.get().admin_ids
 
-# ---------------- ENHANCED FLASK KEEP-ALIVE ----------------
-app = Flask(__name__)
+# ---------------- STARTUP ----------------
+# Milliseconds since PROCESS_START at which each startup phase finished
+STARTUP_PHASES = {}
+BACKGROUND_STARTED = False
+BACKGROUND_LOCK = threading.Lock()
+
+def mark_startup(phase):
+    STARTUP_PHASES[phase] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+
+def start_background_services():
+    """Start the keep-alive web server and pinger once; they are not needed to answer updates.
+
+    Worker processes leave them to the ingest process.
+    """
+    global BACKGROUND_STARTED
+    with BACKGROUND_LOCK:
+        if BACKGROUND_STARTED or WORKER_INDEX is not None:
+            return
+        BACKGROUND_STARTED = True
+    # Start Flask in background for keep-alive (e.g., on Render/Heroku)
+    threading.Thread(target=run_flask, daemon=True).start()
+    # Start auto-ping system in a separate thread
+    threading.Thread(target=auto_ping_system, daemon=True).start()
+
+def report_first_reply():
+    mark_startup("first_reply")
+    log.info("cold_start", extra={
+        "latency_ms": STARTUP_PHASES["first_reply"],
+        "phases": STARTUP_PHASES,
+    })
+    start_background_services()
+
+async def post_init(app_bot):
+    mark_startup("bot_ready")
+
+# ---------------- INSTRUMENTATION ----------------
+# Per-update timings; set by InstrumentedApplication for the duration of one update
+CURRENT_TIMINGS = contextvars.ContextVar("current_timings", default=None)
+SLOW_UPDATES = deque(maxlen=50)
+
+def add_update_time(kind, started):
+    """Charge the time since `started` to the current update's `kind` ("db" or "api") bucket"""
+    timings = CURRENT_TIMINGS.get()
+    if timings is not None:
+        timings[kind] += time.perf_counter() - started
+
+def _tag_handler(callback):
+    async def wrapper(update, context):
+        timings = CURRENT_TIMINGS.get()
+        if timings is not None:
+            timings["handler"] = callback.__name__
+        return await callback(update, context)
+    wrapper.__name__ = callback.__name__
+    return wrapper
+
+class InstrumentedApplication(Application):
+    """Application that times every update and records the slow ones.
+
+    Updates are handled in the context of the application's `tenant`.
+    """
+
+    tenant = DEFAULT_TENANT
+
+    def add_handler(self, handler, group=0):
+        handler.callback = _tag_handler(handler.callback)
+        super().add_handler(handler, group)
+
+    async def process_update(self, update):
+        timings = {"handler": None, "db": 0.0, "api": 0.0}
+        token = CURRENT_TIMINGS.set(timings)
+        tenant_token = CURRENT_TENANT.set(self.tenant)
+        started = time.perf_counter()
+        try:
+            await super().process_update(update)
+        finally:
+            record_update_timings(update, timings, time.perf_counter() - started)
+            if "first_reply" not in STARTUP_PHASES and timings["handler"] is not None:
+                report_first_reply()
+            CURRENT_TENANT.reset(tenant_token)
+            CURRENT_TIMINGS.reset(token)
+
+def record_update_timings(update, timings, elapsed):
+    latency_ms = elapsed * 1000
+    if latency_ms < SLOW_UPDATE_MS or timings["handler"] is None:
+        return
+    user = getattr(update, "effective_user", None)
+    chat = getattr(update, "effective_chat", None)
+    entry = {
+        "at": time.time(),
+        "handler": timings["handler"],
+        "user_id": user.id if user else None,
+        "chat_id": chat.id if chat else None,
+        "latency_ms": round(latency_ms, 1),
+        "db_ms": round(timings["db"] * 1000, 1),
+        "api_ms": round(timings["api"] * 1000, 1),
+    }
+    SLOW_UPDATES.append(entry)
+    log.warning("slow_update", extra={k: v for k, v in entry.items() if k != "at"})
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest that charges Telegram API time to the update being processed"""
+
+    async def do_request(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().do_request(*args, **kwargs)
+        finally:
+            add_update_time("api", started)
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of all threads from a background thread.
+
+    Covers the event loop thread as well as executor and Flask threads. Each
+    stack is rooted at its thread name so the collapsed output separates them.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def top(self, limit=15):
+        """Return [(function, self_samples, total_samples)] sorted by total samples"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for func in set(frames):
+                total[func] += count
+        return [(func, own[func], count) for func, count in total.most_common(limit)]
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+ACTIVE_PROFILER = None
+
+# ---------------- TELEGRAM TRANSPORT ----------------
+# Set while a broadcast is running so its sends go through the bulk pool
+BULK_SEND = contextvars.ContextVar("bulk_send", default=False)
+# Process-wide cap on in-flight bulk sends (one per bulk pool connection), shared by all tenants
+BULK_LIMITER = asyncio.Semaphore(TG_POOL_BULK)
 
-@app.route("/")
+class BulkRateLimiter:
+    """Paces bulk sends per bot: `rate` messages/s overall plus Telegram's per-chat limits.
+
+    Each send reserves the next free slot of its bot and of its chat and sleeps
+    until then, so concurrent senders queue up instead of tripping flood control.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = {}  # bot token or (token, chat_id) -> monotonic time the next send may start
+        self._paused = {}  # bot token -> monotonic time flood control lifts
+
+    async def wait(self, bot, chat_id):
+        # The chat's slot first, so a busy group doesn't hold up the bot's other sends
+        chat_key = (bot.token, chat_id)
+        await self._reserve(chat_key, 60 / TG_GROUP_RATE if int(chat_id) < 0 else 1.0)
+        while True:
+            if self.rate > 0:
+                await self._reserve(bot.token, 1 / self.rate)
+            # A slot reserved before a RetryAfter arrived waits it out and queues up again
+            paused = self._paused.get(bot.token, 0) - time.monotonic()
+            if paused <= 0:
+                return
+            await asyncio.sleep(paused)
+
+    async def _reserve(self, key, interval):
+        now = time.monotonic()
+        slot = max(now, self._next.get(key, 0))
+        self._next[key] = slot + interval
+        if len(self._next) > 4096:
+            self._next = {held: at for held, at in self._next.items() if at > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, bot, seconds):
+        """Hold all bulk sends of `bot` for `seconds` after a flood-control RetryAfter"""
+        until = time.monotonic() + seconds
+        self._paused[bot.token] = max(self._paused.get(bot.token, 0), until)
+        self._next[bot.token] = max(self._next.get(bot.token, 0), until)
+
+BULK_RATE_LIMITER = BulkRateLimiter(TG_BULK_RATE / WORKERS)
+
+class PooledRequest(TimedRequest):
+    """One sized keep-alive pool with per-method read timeouts and connection reuse counters"""
+
+    def __init__(self, name, pool_size, http2=False):
+        super().__init__(
+            connection_pool_size=pool_size,
+            connect_timeout=TG_CONNECT_TIMEOUT,
+            pool_timeout=TG_POOL_TIMEOUT,
+            http_version="2" if http2 else "1.1",
+        )
+        self.name = name
+        self.pool_size = pool_size
+        self.requests = 0
+        self.new_connections = 0
+        # Weak, so a closed connection's memory can't be mistaken for a later one's (as id() could)
+        self._seen_connections = weakref.WeakSet()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        if read_timeout is BaseRequest.DEFAULT_NONE and api_method in TG_METHOD_TIMEOUTS:
+            read_timeout = TG_METHOD_TIMEOUTS[api_method]
+        try:
+            return await super().do_request(url, method, request_data, read_timeout=read_timeout, **kwargs)
+        finally:
+            self.requests += 1
+            self._count_connections()
+
+    def _count_connections(self):
+        # httpx does not expose its pool; peek at httpcore's and fall back to nothing if that changes
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", ()):
+            if connection not in self._seen_connections:
+                self._seen_connections.add(connection)
+                self.new_connections += 1
+
+    def metrics(self):
+        return {
+            "pool": self.name,
+            "size": self.pool_size,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": max(self.requests - self.new_connections, 0),
+        }
+
+class RoutedRequest(PooledRequest):
+    """Reply pool that hands requests made inside a bulk_sends() block to a separate bulk pool"""
+
+    def __init__(self, replies_size, bulk_size, http2=False):
+        super().__init__("replies", replies_size, http2)
+        self.bulk = PooledRequest("bulk", bulk_size, http2)
+
+    async def initialize(self):
+        await super().initialize()
+        await self.bulk.initialize()
+
+    async def shutdown(self):
+        await super().shutdown()
+        await self.bulk.shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        if BULK_SEND.get():
+            return await self.bulk.do_request(*args, **kwargs)
+        return await super().do_request(*args, **kwargs)
+
+def bulk_sends():
+    """Route Telegram calls in the current task to the bulk pool; pass the result to BULK_SEND.reset()"""
+    return BULK_SEND.set(True)
+
+TRANSPORT_POOLS = []
+
+def build_transport(bots=1):
+    """Return (bot request, getUpdates request) configured from the TG_* environment.
+
+    The requests can be shared by `bots` bots; each long poll holds one updates connection.
+    """
+    http2 = TG_HTTP2
+    if http2 and importlib.util.find_spec("h2") is None:
+        log.warning("http2_unavailable", extra={"error": "install httpx[http2] to enable TG_HTTP2"})
+        http2 = False
+    bot_request = RoutedRequest(TG_POOL_REPLIES, TG_POOL_BULK, http2)
+    updates_request = PooledRequest("updates", max(TG_POOL_UPDATES, bots), http2)
+    TRANSPORT_POOLS.extend([updates_request, bot_request, bot_request.bulk])
+    return bot_request, updates_request
+
+def transport_metrics():
+    return [pool.metrics() for pool in TRANSPORT_POOLS]
+
+# ---------------- ENHANCED FLASK KEEP-ALIVE ----------------
 def home():
     return "✅ Viral Music Bot is running! 🎵"
 
-@app.route("/health")
 def health_check():
     """Enhanced health check endpoint for monitoring"""
     try:
         # Check database connection
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM users")
-        user_count = c.fetchone()[0]
-        conn.close()
+        def count_users():
+            conn = db_connect()
+            c = conn.cursor()
+            c.execute("SELECT COUNT(*) FROM users")
+            user_count = c.fetchone()[0]
+            conn.close()
+            return user_count
+        user_count = sum(for_each_tenant(count_users))
         
         # Check bot token availability
-        token_status = "✅ Available" if BOT_TOKEN else "❌ Missing"
+        token_status = "✅ Available" if all(t.token for t in TENANTS) else "❌ Missing"
         
         return {
             "status": "healthy",
@@ -198,6 +1274,7 @@ def health_check():
             "database_status": "✅ Connected",
             "user_count": user_count,
             "bot_token": token_status,
+            "startup_ms": STARTUP_PHASES,
             "version": "1.2"
         }
     except Exception as e:
@@ -207,54 +1284,63 @@ def health_check():
             "timestamp": time.time()
         }, 500
 
-@app.route("/keepalive")
 def keepalive():
     """Endpoint specifically for uptime monitoring services"""
     return {
         "message": "Bot is active and healthy",
         "uptime_seconds": time.time() - START_TIME,
-        "registered_groups": len(get_approved_groups())
+        "registered_groups": sum(for_each_tenant(lambda: len(get_approved_groups()))),
+        "bots": len(TENANTS)
     }
 
 # Global start time for uptime tracking
 START_TIME = time.time()
 
+def create_flask_app():
+    # Imported here: flask is only needed once the bot is already answering
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.add_url_rule("/", view_func=home)
+    app.add_url_rule("/health", view_func=health_check)
+    app.add_url_rule("/keepalive", view_func=keepalive)
+    return app
+
 def run_flask():
     """Run Flask server with production settings"""
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, threaded=True)
+    create_flask_app().run(host="0.0.0.0", port=port, threaded=True)
 
 # ---------------- AUTO-PING SYSTEM ----------------
 def auto_ping_system():
     """Periodically ping the bot's own endpoints to stay active"""
-    print("🔄 Auto-ping system started - keeping bot alive every 10 minutes")
+    import requests
+
+    log.info("auto_ping_started", extra={"interval_s": 600})
+    # One keep-alive session so pings reuse the connection instead of reconnecting each time
+    session = requests.Session()
     
     while True:
         try:
-            # Ping the main endpoint
-            main_response = requests.get(f"{RENDER_APP_URL}/", timeout=10)
-            print(f"🏓 Main endpoint ping: {main_response.status_code}")
-            
-            # Ping the health endpoint
-            health_response = requests.get(f"{RENDER_APP_URL}/health", timeout=10)
-            print(f"🏥 Health check ping: {health_response.status_code}")
-            
-            # Ping the keepalive endpoint
-            keepalive_response = requests.get(f"{RENDER_APP_URL}/keepalive", timeout=10)
-            print(f"⚡ Keepalive ping: {keepalive_response.status_code}")
-            
-            print(f"✅ All endpoints pinged successfully at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            # Ping the main, health and keepalive endpoints
+            for path in ("/", "/health", "/keepalive"):
+                started = time.perf_counter()
+                response = session.get(f"{RENDER_APP_URL}{path}", timeout=10)
+                log.info("ping", extra={
+                    "command": path,
+                    "status": response.status_code,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                })
             
         except Exception as e:
-            print(f"❌ Ping failed: {e}")
-            print(f"⚠️  Trying backup ping method...")
+            log.warning("ping_failed", extra={"error": str(e)})
             
             # Backup ping method
             try:
-                backup_response = requests.get(f"{RENDER_APP_URL}/", timeout=15)
-                print(f"🔄 Backup ping successful: {backup_response.status_code}")
+                backup_response = session.get(f"{RENDER_APP_URL}/", timeout=15)
+                log.info("ping_backup", extra={"status": backup_response.status_code})
             except Exception as backup_e:
-                print(f"❌ Backup ping also failed: {backup_e}")
+                log.error("ping_backup_failed", extra={"error": str(backup_e)})
         
         # Wait 10 minutes (600 seconds) before next ping
         # This is more frequent than the 15-minute requirement to be safe
@@ -330,7 +1416,7 @@ async def unregister_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     # Only allow global admins or the person who registered the group
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT added_by FROM approved_groups WHERE chat_id=?", (chat.id,))
     result = c.fetchone()
@@ -348,11 +1434,12 @@ async def unregister_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     # Remove from database
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("DELETE FROM approved_groups WHERE chat_id=?", (chat.id,))
     conn.commit()
     conn.close()
+    invalidate("groups")
     
     await update.message.reply_text(
         f"✅ Group '{chat.title}' has been unregistered from auto-broadcasts.\n\n"
@@ -409,45 +1496,101 @@ async def listgroups_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 # ---------------- BROADCAST TO GROUPS ----------------
-async def broadcast_to_groups(context: ContextTypes.DEFAULT_TYPE, link: str, promoted_by: int, original_chat_id: int):
+async def send_bulk(bot, chat_id, text, **kwargs):
+    """Send one message of a fan-out, paced by BULK_RATE_LIMITER.
+
+    A flood-control RetryAfter pauses all of the bot's bulk sends and the
+    message is retried, up to TG_BULK_RETRIES times.
+    """
+    async with BULK_LIMITER:
+        for attempt in range(TG_BULK_RETRIES + 1):
+            await BULK_RATE_LIMITER.wait(bot, chat_id)
+            try:
+                return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                if attempt == TG_BULK_RETRIES:
+                    raise
+                log.warning("flood_control", extra={"chat_id": chat_id, "error": str(e)})
+                BULK_RATE_LIMITER.pause(bot, e.retry_after)
+
+async def fan_out(items, send):
+    """Run `send(item)` for every item through the bulk pool, from TG_POOL_BULK worker tasks fed by a queue.
+
+    Returns how many sends returned True.
+    """
+    pending = asyncio.Queue()
+    for item in items:
+        pending.put_nowait(item)
+
+    async def worker():
+        sent = 0
+        while not pending.empty():
+            if await send(pending.get_nowait()):
+                sent += 1
+        return sent
+
+    token = bulk_sends()
+    try:
+        results = await asyncio.gather(*(worker() for _ in range(min(TG_POOL_BULK, pending.qsize()))))
+    finally:
+        BULK_SEND.reset(token)
+    return sum(results)
+
+def start_fan_out(application, coroutine):
+    """Run a fan-out as a background task of `application` so the handler can return straight away"""
+    def detached():
+        # The update's timings are recorded when its handler returns; the fan-out outlives them
+        CURRENT_TIMINGS.set(None)
+        return application.create_task(coroutine)
+    return contextvars.copy_context().run(detached)
+
+async def broadcast_to_groups(bot, link: str, promoted_by: int, original_chat_id: int):
     """Broadcast a promotion link to all registered groups"""
     groups = get_approved_groups()
     
     if not groups:
         return 0  # No groups to broadcast to
     
-    successful = 0
-    failed = 0
+    started = time.perf_counter()
     
-    for chat_id, title, username in groups:
-        # Skip the original chat if it's a group to avoid duplicate messages
-        if chat_id == original_chat_id:
-            continue
-        
+    async def send_to_group(chat_id, title):
+        # Format the broadcast message
+        message = (
+            "📣 <b>New Promotion Shared!</b>\n\n"
+            f"🔗 <b>Link:</b> {link}\n\n"
+            f"👤 <b>Shared by:</b> User {promoted_by}\n"
+            f"🏠 <b>Group:</b> {title}"
+        )
         try:
-            # Format the broadcast message
-            message = (
-                "📣 <b>New Promotion Shared!</b>\n\n"
-                f"🔗 <b>Link:</b> {link}\n\n"
-                f"👤 <b>Shared by:</b> User {promoted_by}\n"
-                f"🏠 <b>Group:</b> {title}"
-            )
-            
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=message,
+            await send_bulk(
+                bot, chat_id, message,
                 parse_mode=ParseMode.HTML,
                 disable_web_page_preview=False
             )
-            
-            # Log the successful broadcast
-            log_broadcast(chat_id, link, promoted_by)
-            successful += 1
-            
         except TelegramError as e:
-            print(f"❌ Failed to broadcast to group {chat_id} ({title}): {e}")
-            failed += 1
+            log.warning("group_broadcast_failed", extra={
+                "command": "promote",
+                "user_id": promoted_by,
+                "chat_id": chat_id,
+                "error": str(e),
+            })
+            return False
+        # Log the successful broadcast
+        log_broadcast(chat_id, link, promoted_by)
+        return True
+    
+    # Skip the original chat if it's a group to avoid duplicate messages
+    targets = [(chat_id, title) for chat_id, title, username in groups if chat_id != original_chat_id]
+    successful = await fan_out(targets, lambda group: send_to_group(*group))
+    failed = len(targets) - successful
     
+    log.info("group_broadcast_done", extra={
+        "command": "promote",
+        "user_id": promoted_by,
+        "sent": successful,
+        "failed": failed,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
     return successful
 
 # ---------------- BOT HANDLERS ----------------
@@ -458,14 +1601,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     get_user(user_id)
+    songs = CURRENT_TENANT.get().songs
+    titles = ", ".join(html.escape(song["title"]) for song in songs.values())
     keyboard = [
-        [InlineKeyboardButton("🎧 Listen to Song 1", url=SONGS["song1"]["url"])],
-        [InlineKeyboardButton("🎧 Listen to Song 2", url=SONGS["song2"]["url"])],
-        [InlineKeyboardButton("✅ I listened – Take Quiz", callback_data="quiz")]
+        [InlineKeyboardButton(f"🎧 Listen to Song {i}", url=song["url"])]
+        for i, song in enumerate(songs.values(), 1)
     ]
+    keyboard.append([InlineKeyboardButton("✅ I listened – Take Quiz", callback_data="quiz")])
     message = (
         "🎶 <b>Welcome to Viral Music Bot!</b>\n\n"
-        "🎵 Listen to inspiring songs about mothers and teachers\n"
+        f"🎵 Listen to our songs: {titles}\n"
         "🧠 Take quizzes to unlock rewards\n"
         "📣 Share your links and get them promoted across multiple groups\n\n"
         "<b>How to get started:</b>\n"
@@ -483,6 +1628,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode=ParseMode.HTML
     )
 
+async def send_quiz_question(message, quiz, question):
+    progress = f" ({question.number}/{len(quiz)})" if len(quiz) > 1 else ""
+    await message.reply_text(
+        f"🧠 <b>Quiz{progress}: {html.escape(question.prompt)}</b>\n\n"
+        "<i>Listen carefully to the lyrics before answering!</i>",
+        reply_markup=quiz_keyboard(question),
+        parse_mode=ParseMode.HTML
+    )
+
 async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -493,39 +1647,60 @@ async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text("⚠️ Quiz already passed. You have rewards unlocked.")
         return
 
-    keyboard = [
-        [InlineKeyboardButton("Tribute to my Dear Mama ❤️", callback_data="q1_mama")],
-        [InlineKeyboardButton("Tribute to Nannies & Teachers 👩‍🏫", callback_data="q1_teachers")],
-        [InlineKeyboardButton("Just a Party Song 🎉", callback_data="wrong")]
-    ]
-    await query.message.reply_text(
-        "🧠 <b>Quiz: What are the songs mainly about?</b>\n\n"
-        "<i>Listen carefully to the lyrics before answering!</i>",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode=ParseMode.HTML
-    )
+    quiz_index = CURRENT_TENANT.get().quiz
+    if not quiz_index:
+        await query.message.reply_text("⚠️ No quiz is available right now. Please try again later.")
+        return
+    set_quiz_progress(user_id, quiz_index.first_id)
+    await send_quiz_question(query.message, quiz_index, quiz_index.questions[quiz_index.first_id])
 
 async def quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
+    tenant = CURRENT_TENANT.get()
 
-    if query.data in ["q1_mama", "q1_teachers"]:
-        unlock_reward(user_id)
-        await query.message.reply_text(
-            "✅ <b>Correct!</b> Reward unlocked.\n\n"
-            "🎯 You now have <b>20 promotions</b> to use!\n"
-            "📣 Use <code>/promote your_link</code> to share your content\n"
-            "🔄 Your link will be automatically broadcasted to all registered groups\n\n"
-            "<i>💡 Want your group to receive these broadcasts? Ask an admin to use /register_group!</i>",
-            parse_mode=ParseMode.HTML
-        )
-    else:
+    answer = parse_quiz_callback(query.data)
+    question = tenant.quiz.questions.get(answer[0]) if answer and tenant.quiz else None
+    if question is None or not 0 <= answer[1] < len(question.options):
+        await query.message.reply_text("⚠️ This quiz has expired. Tap 'I listened – Take Quiz' to start again.")
+        return
+
+    # Questions must be answered in order; a user with no progress (e.g. after a restart) is on the first
+    expected_id = tenant.quiz_progress.get(user_id, tenant.quiz.first_id)
+    if question.id != expected_id:
+        await query.message.reply_text("⚠️ Please answer this question first.")
+        await send_quiz_question(query.message, tenant.quiz, tenant.quiz.questions[expected_id])
+        return
+
+    correct = answer[1] in question.correct
+    tenant.attempts.add((user_id, question.id, answer[1], int(correct)))
+
+    if not correct:
         await query.message.reply_text(
             "❌ <b>Incorrect.</b> Listen again and retry.\n\n"
             "🎧 Click the song links above to listen again.",
             parse_mode=ParseMode.HTML
         )
+        return
+
+    set_quiz_progress(user_id, question.next_id)
+    if question.next_id is not None:
+        await send_quiz_question(query.message, tenant.quiz, tenant.quiz.questions[question.next_id])
+        return
+
+    if get_user(user_id)[1] == 1:
+        await query.message.reply_text("⚠️ Quiz already passed. You have rewards unlocked.")
+        return
+    unlock_reward(user_id)
+    await query.message.reply_text(
+        "✅ <b>Correct!</b> Reward unlocked.\n\n"
+        "🎯 You now have <b>20 promotions</b> to use!\n"
+        "📣 Use <code>/promote your_link</code> to share your content\n"
+        "🔄 Your link will be automatically broadcasted to all registered groups\n\n"
+        "<i>💡 Want your group to receive these broadcasts? Ask an admin to use /register_group!</i>",
+        parse_mode=ParseMode.HTML
+    )
 
 async def promote(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -581,8 +1756,18 @@ async def promote(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Broadcast to groups if any are registered
     groups = get_approved_groups()
     if groups:
-        successful_broadcasts = await broadcast_to_groups(context, link, user_id, chat.id)
-        confirmation_msg += f"📢 <b>Broadcasted to {successful_broadcasts} groups!</b>"
+        if WORKERS > 1:
+            # Any idle worker picks the fan-out up, so this user's shard isn't held up by it
+            STATE.push("broadcasts", {
+                "tenant": CURRENT_TENANT.get().name,
+                "link": link,
+                "promoted_by": user_id,
+                "original_chat_id": chat.id,
+            })
+        else:
+            # The paced fan-out takes a while; other updates keep being answered meanwhile
+            start_fan_out(context.application, broadcast_to_groups(context.bot, link, user_id, chat.id))
+        confirmation_msg += f"📢 <b>Broadcasting to {len(groups)} groups!</b>"
     else:
         confirmation_msg += "⚠️ <b>No groups registered yet.</b> Ask admins to use /register_group to receive broadcasts."
     
@@ -615,16 +1800,7 @@ async def myreward(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ---------------- LEADERBOARD ----------------
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        SELECT user_id, quizzes_passed, promotions_used
-        FROM users
-        ORDER BY quizzes_passed DESC, promotions_used DESC
-        LIMIT 10
-    """)
-    rows = c.fetchall()
-    conn.close()
+    rows = get_leaderboard()
     if not rows:
         await update.message.reply_text("🏆 Leaderboard is empty.")
         return
@@ -646,19 +1822,33 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /broadcast <message>")
         return
     message = " ".join(context.args)
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT user_id FROM users")
     users = c.fetchall()
     conn.close()
-    sent = 0
-    for (uid,) in users:
+    await update.message.reply_text(f"📣 Broadcasting to {len(users)} users...")
+    started = time.perf_counter()
+    
+    async def send_to_user(uid):
         try:
-            await context.bot.send_message(uid, message)
-            sent += 1
+            await send_bulk(context.bot, uid, message)
+            return True
         except Exception as e:
-            print(f"Failed to send to {uid}: {e}")
-            pass  # silently skip failed sends
+            log.warning("broadcast_send_failed", extra={
+                "command": "broadcast", "user_id": user_id, "chat_id": uid, "error": str(e),
+            })
+            return False
+    
+    sent = await fan_out((uid for (uid,) in users), send_to_user)
+    failed = len(users) - sent
+    log.info("broadcast_done", extra={
+        "command": "broadcast",
+        "user_id": user_id,
+        "sent": sent,
+        "failed": failed,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
     await update.message.reply_text(f"✅ Broadcast sent to {sent} users.")
 
 async def addreward(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -673,12 +1863,13 @@ async def addreward(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("⚠️ Invalid user ID.")
         return
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("UPDATE users SET shares_left = shares_left + 20 WHERE user_id=?", (uid,))
     updated = c.rowcount
     conn.commit()
     conn.close()
+    forget_user(uid)
     if updated:
         await update.message.reply_text(f"✅ Added 20 shares to user {uid}")
     else:
@@ -688,7 +1879,7 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if not is_admin(user_id):
         return
-    conn = sqlite3.connect(DB_FILE)
+    conn = db_connect()
     c = conn.cursor()
     c.execute("SELECT COUNT(*) FROM users")
     total_users = c.fetchone()[0]
@@ -707,10 +1898,75 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🎓 Total Quizzes Passed: {total_quizzes}\n"
         f"📣 Total Promotions Used: {total_promos}\n"
         f"🏢 Registered Groups: {total_groups}\n"
-        f"📡 Total Group Broadcasts: {total_broadcasts}",
+        f"📡 Total Group Broadcasts: {total_broadcasts}"
+        + "".join(
+            f"\n🔌 {m['pool']} pool ({m['size']}): {m['requests']} requests, "
+            f"{m['new_connections']} connections, {m['reused']} reused"
+            for m in transport_metrics()
+        ),
         parse_mode=ParseMode.HTML
     )
 
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Sample all threads for N seconds and reply with the hottest functions"""
+    global ACTIVE_PROFILER
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("⛔ Admin only command.")
+        return
+    try:
+        seconds = int(context.args[0]) if context.args else 10
+    except ValueError:
+        await update.message.reply_text("Usage: /profile <seconds>")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    if ACTIVE_PROFILER is not None:
+        await update.message.reply_text("⏳ A profile is already running.")
+        return
+
+    ACTIVE_PROFILER = profiler = SamplingProfiler()
+    profiler.start()
+    await update.message.reply_text(f"🔬 Profiling for {seconds}s...")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(profiler.stop)
+        ACTIVE_PROFILER = None
+
+    if not profiler.samples:
+        await update.message.reply_text("⚠️ No samples collected.")
+        return
+    text = f"🔬 <b>Profile ({seconds}s, {profiler.samples} samples)</b>\n\n"
+    text += "<code>  self%  total%  function</code>\n"
+    for func, own, total in profiler.top():
+        text += (
+            f"<code>{own * 100 / profiler.samples:6.1f} {total * 100 / profiler.samples:7.1f}  "
+            f"{html.escape(func)}</code>\n"
+        )
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+    await update.message.reply_document(
+        document=io.BytesIO(profiler.collapsed().encode()),
+        filename=f"profile-{int(time.time())}.collapsed.txt",
+        caption="Collapsed stacks (flamegraph.pl / speedscope)",
+    )
+    log.info("profile_done", extra={"command": "profile", "user_id": user_id, "latency_ms": seconds * 1000})
+
+async def slowlog_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the most recent slow updates"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Admin only command.")
+        return
+    if not SLOW_UPDATES:
+        await update.message.reply_text(f"🐢 No updates slower than {SLOW_UPDATE_MS:.0f}ms recorded.")
+        return
+    text = f"🐢 <b>Slow Updates</b> (&gt; {SLOW_UPDATE_MS:.0f}ms)\n\n"
+    for entry in list(SLOW_UPDATES)[-15:]:
+        text += (
+            f"{time.strftime('%H:%M:%S', time.localtime(entry['at']))} <b>{entry['handler']}</b>\n"
+            f"   ⏱ {entry['latency_ms']}ms | 🗄 DB {entry['db_ms']}ms | 📡 API {entry['api_ms']}ms\n"
+        )
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
+
 # ---------------- MONETIZATION PLACEHOLDERS ----------------
 async def buy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -747,22 +2003,31 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/addreward <user_id> - Add 20 shares to a user\n"
         "/stats - View bot statistics\n"
         "/listgroups - List all registered groups\n"
-        "/groupstats - View group broadcast statistics\n\n"
+        "/groupstats - View group broadcast statistics\n"
+        "/profile <seconds> - Profile the bot and get the hottest functions\n"
+        "/slowlog - Show recent slow updates\n\n"
         "<i>💡 Tip: To unlock promotions, listen to songs and pass the quiz first!</i>"
     )
     await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
 
 # ---------------- MAIN ----------------
-def main():
-    init_db()
-    
-    # Start Flask in background for keep-alive (e.g., on Render/Heroku)
-    threading.Thread(target=run_flask, daemon=True).start()
-    
-    # Start auto-ping system in a separate thread
-    threading.Thread(target=auto_ping_system, daemon=True).start()
+def application_builder(tenant, bot_request, updates_request=None):
+    """Builder for a tenant's Application; without `updates_request` it gets no updater (worker mode)"""
+    builder = (
+        ApplicationBuilder()
+        .token(tenant.token)
+        .base_url(TG_BASE_URL)
+        .application_class(InstrumentedApplication)
+        .request(bot_request)
+        .post_init(post_init)
+    )
+    if updates_request is None:
+        return builder.updater(None)
+    return builder.get_updates_request(updates_request)
 
-    app_bot = ApplicationBuilder().token(BOT_TOKEN).build()
+def build_application(tenant, bot_request, updates_request=None):
+    app_bot = application_builder(tenant, bot_request, updates_request).build()
+    app_bot.tenant = tenant
 
     # User commands
     app_bot.add_handler(CommandHandler("start", start))
@@ -779,22 +2044,204 @@ def main():
     app_bot.add_handler(CommandHandler("groupstats", groupstats_cmd))
 
     # Admin commands
-    app_bot.add_handler(CommandHandler("broadcast", broadcast))
+    # Long fan-out; run it beside other updates instead of holding them up
+    app_bot.add_handler(CommandHandler("broadcast", broadcast, block=False))
     app_bot.add_handler(CommandHandler("addreward", addreward))
     app_bot.add_handler(CommandHandler("stats", stats))
+    # Non-blocking so other updates keep flowing (and get sampled) while profiling
+    app_bot.add_handler(CommandHandler("profile", profile_cmd, block=False))
+    app_bot.add_handler(CommandHandler("slowlog", slowlog_cmd))
 
     # Quiz handlers
     app_bot.add_handler(CallbackQueryHandler(quiz, pattern="^quiz$"))
-    app_bot.add_handler(CallbackQueryHandler(quiz_answer, pattern="^q1_"))
+    app_bot.add_handler(CallbackQueryHandler(
+        quiz_answer, pattern=f"^({QUIZ_CALLBACK_PREFIX}:|q1_|wrong$)"
+    ))
+
+    return app_bot
+
+async def run_tenants(apps):
+    """Poll several bots on one event loop until SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    for app_bot in apps:
+        await app_bot.initialize()
+        # run_polling() would call post_init; driving the apps by hand, so do it here
+        if app_bot.post_init:
+            await app_bot.post_init(app_bot)
+        await app_bot.start()
+        await app_bot.updater.start_polling()
+    await stop.wait()
+
+    for app_bot in apps:
+        await app_bot.updater.stop()
+        await app_bot.stop()
+    # The HTTP pools are shared, so only close them once every bot has stopped
+    for app_bot in apps:
+        await app_bot.shutdown()
+
+# ---------------- WORKERS ----------------
+def build_ingest_application(tenant, bot_request, updates_request, worker_queues):
+    """Application that only polls and hands each update to the worker owning its user"""
+    app_bot = application_builder(tenant, bot_request, updates_request).build()
+    app_bot.tenant = tenant
+
+    async def route_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        shard = user_shard(user.id) if user else 0
+        worker_queues[shard].put((tenant.name, update.to_dict()))
+
+    app_bot.add_handler(TypeHandler(Update, route_update))
+    return app_bot
+
+async def drain_broadcasts(apps):
+    """Run group fan-outs queued by promote() in any worker"""
+    by_name = {app_bot.tenant.name: app_bot for app_bot in apps}
+    while True:
+        job = await asyncio.to_thread(STATE.pop, "broadcasts")
+        if job is None:
+            await asyncio.sleep(BROADCAST_POLL_INTERVAL)
+            continue
+        app_bot = by_name.get(job["tenant"])
+        if app_bot is None:
+            continue
+        token = CURRENT_TENANT.set(app_bot.tenant)
+        try:
+            await broadcast_to_groups(app_bot.bot, job["link"], job["promoted_by"], job["original_chat_id"])
+        except Exception:
+            log.exception("queued_broadcast_failed", extra={"user_id": job["promoted_by"]})
+        finally:
+            CURRENT_TENANT.reset(token)
 
-    print("🚀 Bot is running with group broadcasting feature...")
-    print("🔧 BOT_TOKEN environment variable is set")
-    print(f"👑 Admin ID: {ADMIN_IDS}")
-    print(f"🌐 Render App URL: {RENDER_APP_URL}")
-    print("👥 Add this bot to groups and use /register_group to enable auto-broadcasts")
-    print("🔄 Auto-ping system will keep bot alive every 10 minutes")
+async def run_worker(apps, update_queue):
+    for app_bot in apps:
+        await app_bot.initialize()
+        if app_bot.post_init:
+            await app_bot.post_init(app_bot)
+        await app_bot.start()
+    drainer = asyncio.create_task(drain_broadcasts(apps))
+    by_name = {app_bot.tenant.name: app_bot for app_bot in apps}
+    loop = asyncio.get_running_loop()
+
+    while True:
+        item = await loop.run_in_executor(None, update_queue.get)
+        if item is None:
+            break
+        tenant_name, data = item
+        app_bot = by_name[tenant_name]
+        await app_bot.update_queue.put(Update.de_json(data, app_bot.bot))
+
+    drainer.cancel()
+    for app_bot in apps:
+        await app_bot.stop()
+    for app_bot in apps:
+        await app_bot.shutdown()
+
+def worker_main(index, update_queue, state_spec):
+    """Entry point of a worker process: handle the updates routed to shard `index`"""
+    global STATE, WORKER_INDEX
+    # The ingest process owns Ctrl+C and tells workers to stop through their queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    WORKER_INDEX = index
+    setup_logging()
+    STATE = open_state_backend(state_spec)
+    if BOTS_CONFIG:
+        TENANTS[:] = load_tenants(BOTS_CONFIG)
+    for_each_tenant(load_quiz)
+
+    bot_request, _ = build_transport(bots=len(TENANTS))
+    apps = [build_application(tenant, bot_request) for tenant in TENANTS]
+    log.info("worker_started", extra={"workers": WORKERS})
+    asyncio.run(run_worker(apps, update_queue))
+
+def start_workers():
+    """Start the state backend and WORKERS worker processes; returns (update queues, processes, manager)"""
+    global STATE
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    manager = None
+    if STATE_BACKEND == "sqlite":
+        state_spec = ("sqlite", STATE_DB)
+    elif STATE_BACKEND == "manager":
+        host, port = STATE_ADDRESS.rsplit(":", 1)
+        authkey = os.urandom(16)
+        manager = state_manager_class()(address=(host, int(port)), authkey=authkey, ctx=ctx)
+        manager.start()
+        state_spec = ("manager", manager.address, authkey)
+    else:
+        raise ValueError("WORKERS > 1 needs a shared STATE_BACKEND (sqlite or manager)")
+    STATE = open_state_backend(state_spec)
+
+    queues = [ctx.Queue() for _ in range(WORKERS)]
+    processes = [
+        ctx.Process(target=worker_main, args=(i, queues[i], state_spec), name=f"worker-{i}", daemon=True)
+        for i in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    return queues, processes, manager
+
+def stop_workers(queues, processes, manager):
+    for update_queue in queues:
+        update_queue.put(None)
+    for process in processes:
+        process.join(timeout=30)
+    if manager is not None:
+        manager.shutdown()
+
+def main():
+    mark_startup("imports")
+    setup_logging()
+    if BOTS_CONFIG:
+        TENANTS[:] = load_tenants(BOTS_CONFIG)
+    for_each_tenant(migrate_db)
+    mark_startup("migrations")
+    # In worker mode this process only routes updates; the workers load the quiz themselves
+    if WORKERS == 1:
+        for_each_tenant(load_quiz)
+        for_each_tenant(restore_snapshot)
+        mark_startup("snapshot")
+    
+    # Web server and pinger wait for the first update so they don't compete with it
+    timer = threading.Timer(COLD_START_DEFER, start_background_services)
+    timer.daemon = True
+    timer.start()
+
+    # One set of HTTP pools for every hosted bot
+    bot_request, updates_request = build_transport(bots=len(TENANTS))
+    if WORKERS > 1:
+        workers = start_workers()
+        apps = [
+            build_ingest_application(tenant, bot_request, updates_request, workers[0])
+            for tenant in TENANTS
+        ]
+    else:
+        apps = [build_application(tenant, bot_request, updates_request) for tenant in TENANTS]
+
+    for tenant in TENANTS:
+        log.info("bot_starting", extra={
+            "tenant": tenant.name,
+            "admins": sorted(tenant.admin_ids),
+            "url": RENDER_APP_URL,
+            "workers": WORKERS,
+        })
     
-    app_bot.run_polling()
+    if len(apps) == 1:
+        apps[0].run_polling()
+    else:
+        asyncio.run(run_tenants(apps))
+
+    if WORKERS > 1:
+        stop_workers(*workers)
+    else:
+        # Pending quiz attempts must be written before the snapshot fingerprints the database
+        for tenant in TENANTS:
+            tenant.attempts.close()
+        for_each_tenant(save_snapshot)
 
 if __name__ == "__main__":
     main()
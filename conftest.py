@@ -0,0 +1,4 @@
+# bot.py reads BOT_TOKEN at import time; this file also puts the repo root on sys.path for tests/
+import os
+
+os.environ.setdefault("BOT_TOKEN", "123456:test")
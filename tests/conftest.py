@@ -0,0 +1,37 @@
+import contextlib
+
+import pytest
+
+import bot
+
+
+class SimulatedProcess:
+    """One bot process: its own tenant caches and its own connection to the shared state database"""
+
+    def __init__(self, db_file, state_db):
+        self.tenant = bot.Tenant("default", bot.BOT_TOKEN, [1], bot.SONGS, db_file)
+        self.state = bot.SqliteStateBackend(state_db)
+
+    @contextlib.contextmanager
+    def active(self):
+        """Make this process's tenant and state current, like InstrumentedApplication does per update"""
+        saved_state = bot.STATE
+        bot.STATE = self.state
+        token = bot.CURRENT_TENANT.set(self.tenant)
+        try:
+            yield self
+        finally:
+            bot.CURRENT_TENANT.reset(token)
+            bot.STATE = saved_state
+
+
+@pytest.fixture
+def processes(tmp_path, monkeypatch):
+    """Two worker processes sharing one migrated bot database and one SQLite state backend"""
+    monkeypatch.setattr(bot, "WORKERS", 2)
+    db_file = str(tmp_path / "bot.db")
+    state_db = str(tmp_path / "state.db")
+    first, second = SimulatedProcess(db_file, state_db), SimulatedProcess(db_file, state_db)
+    with first.active():
+        bot.migrate_db()
+    return first, second
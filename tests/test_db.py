@@ -0,0 +1,22 @@
+import sqlite3
+from collections import Counter
+
+import bot
+
+
+def test_timed_connection_charges_queries_and_fetches():
+    timings = Counter()
+    token = bot.CURRENT_TIMINGS.set(timings)
+    try:
+        conn = sqlite3.connect(":memory:", factory=bot.TimedConnection)
+        conn.execute("CREATE TABLE t (x)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+        cursor = conn.execute("SELECT x FROM t ORDER BY x")
+        assert isinstance(cursor, bot.TimedCursor)
+        assert cursor.fetchone() == (0,)
+        assert cursor.fetchmany(size=2) == [(1,), (2,)]
+        assert len(cursor.fetchall()) == 7
+        conn.close()
+    finally:
+        bot.CURRENT_TIMINGS.reset(token)
+    assert timings["db"] > 0
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import sqlite3
+import time
+import urllib.parse
+
+import pytest
+from telegram import Update
+from telegram.request import BaseRequest
+
+import bot
+
+ADMIN_ID = 1
+
+
+class RecordingRequest(BaseRequest):
+    """Answers every Bot API call locally and records (method, chat_id, time) for sendMessage"""
+
+    def __init__(self):
+        self.sent = []
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        if api_method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "test", "username": "test_bot"}
+        else:
+            params = urllib.parse.parse_qs(request_data.url_encoded_parameters()) if request_data else {}
+            chat_id = int(params["chat_id"][0])
+            self.sent.append((chat_id, time.monotonic()))
+            result = {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def command_update(update_id, user_id, text, chat_id=None):
+    chat_id = chat_id or user_id
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group", "title": "g"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "test"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        },
+    }
+
+
+@pytest.fixture
+def tenant(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "STATE", bot.MemoryStateBackend())
+    monkeypatch.setattr(bot, "start_background_services", lambda: None)  # no web server or pinger
+    monkeypatch.setattr(bot, "BULK_RATE_LIMITER", bot.BulkRateLimiter(25))
+    monkeypatch.setattr(bot, "BULK_LIMITER", asyncio.Semaphore(bot.TG_POOL_BULK))  # one per event loop
+    tenant = bot.Tenant("default", bot.BOT_TOKEN, [ADMIN_ID], bot.SONGS, str(tmp_path / "bot.db"))
+    token = bot.CURRENT_TENANT.set(tenant)
+    bot.migrate_db()
+    bot.load_quiz()
+    yield tenant
+    tenant.attempts.close()
+    bot.CURRENT_TENANT.reset(token)
+
+
+async def reply_during_fan_out(tenant, fan_out_update, fan_out_size):
+    """Start a paced fan-out, then send /start; return (reply time, fan-out send times)"""
+    request = RecordingRequest()
+    app = bot.build_application(tenant, request)
+    async with app:
+        await app.start()
+        await app.process_update(Update.de_json(fan_out_update, app.bot))
+        await asyncio.sleep(0.2)
+        await app.process_update(Update.de_json(command_update(99, 999, "/start"), app.bot))
+        reply_at = next(at for chat_id, at in request.sent if chat_id == 999)
+
+        def fan_out():
+            return [at for chat_id, at in request.sent if chat_id not in (ADMIN_ID, 999)]
+
+        deadline = time.monotonic() + 10
+        while len(fan_out()) < fan_out_size and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await app.stop()
+    return reply_at, fan_out()
+
+
+def test_reply_is_served_during_broadcast(tenant):
+    conn = sqlite3.connect(tenant.db_file)
+    conn.executemany("INSERT INTO users (user_id) VALUES (?)", [(100 + i,) for i in range(30)])
+    conn.commit()
+    conn.close()
+    # 30 users at 25/s: about 1.2s of sends; the admin's "Broadcasting..." and "sent" replies go to ADMIN_ID
+    reply_at, fan_out = asyncio.run(reply_during_fan_out(tenant, command_update(1, ADMIN_ID, "/broadcast hi"), 30))
+    assert len(fan_out) == 30
+    assert fan_out[0] < reply_at < fan_out[-1]
+
+
+def test_reply_is_served_during_group_promotion(tenant):
+    bot.get_user(ADMIN_ID)
+    bot.unlock_reward(ADMIN_ID)
+    for i in range(30):
+        bot.register_group(-1000 - i, ADMIN_ID, f"group {i}")
+    # The promotion confirmation goes to the promoter's chat, the fan-out to the 30 groups
+    reply_at, fan_out = asyncio.run(
+        reply_during_fan_out(tenant, command_update(1, ADMIN_ID, "/promote https://example.com"), 30)
+    )
+    assert len(fan_out) == 30
+    assert fan_out[0] < reply_at < fan_out[-1]
@@ -0,0 +1,27 @@
+import json
+import logging
+import sys
+
+import bot
+
+
+def error_record(exc, name="telegram.ext.Application"):
+    try:
+        raise exc
+    except Exception:
+        exc_info = sys.exc_info()
+    return logging.LogRecord(name, logging.ERROR, __file__, 1, "No error handlers are registered", None, exc_info)
+
+
+def test_different_exceptions_are_not_collapsed():
+    rate_limit = bot.RateLimitFilter(30)
+    records = [error_record(exc) for exc in (KeyError("k"), ZeroDivisionError(), TypeError("t"))]
+    assert all(rate_limit.filter(record) for record in records)
+    assert not rate_limit.filter(error_record(KeyError("again")))
+
+
+def test_traceback_survives_the_queue():
+    handler = bot.StructuredQueueHandler(None)
+    payload = json.loads(bot.JsonFormatter().format(handler.prepare(error_record(KeyError("k")))))
+    assert payload["level"] == "ERROR"
+    assert "KeyError" in payload["exc"]
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class FakeQuery:
+    def __init__(self, user_id, data):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.message = FakeMessage()
+
+    async def answer(self):
+        pass
+
+
+@pytest.fixture
+def tenant(tmp_path, monkeypatch):
+    """A tenant whose quiz is the seeded question (id 1) followed by one about song2"""
+    monkeypatch.setattr(bot, "STATE", bot.MemoryStateBackend())
+    tenant = bot.Tenant("default", bot.BOT_TOKEN, [1], bot.SONGS, str(tmp_path / "bot.db"))
+    token = bot.CURRENT_TENANT.set(tenant)
+    bot.migrate_db()
+    conn = sqlite3.connect(tenant.db_file)
+    conn.executescript("""
+        INSERT INTO quiz_questions (id, song_key, position, prompt) VALUES (2, 'song2', 1, 'Who is it for?');
+        INSERT INTO quiz_options (question_id, position, label, correct) VALUES
+            (2, 0, 'Nannies & Teachers', 1),
+            (2, 1, 'Pilots', 0);
+    """)
+    conn.close()
+    bot.load_quiz()
+    yield tenant
+    tenant.attempts.close()
+    bot.CURRENT_TENANT.reset(token)
+
+
+def tap(user_id, data):
+    """Press a button as `user_id` and return the bot's replies"""
+    query = FakeQuery(user_id, data)
+    handler = bot.quiz if data == "quiz" else bot.quiz_answer
+    asyncio.run(handler(SimpleNamespace(callback_query=query), None))
+    return query.message.replies
+
+
+def attempts(tenant):
+    tenant.attempts.flush()
+    conn = sqlite3.connect(tenant.db_file)
+    rows = conn.execute("SELECT user_id, question_id, option_index, correct FROM quiz_attempts ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def unlocked(user_id):
+    return bot.get_user(user_id)[1] == 1
+
+
+def test_parse_quiz_callback():
+    assert bot.parse_quiz_callback(bot.quiz_callback(12, 3)) == (12, 3)
+    assert bot.parse_quiz_callback("q1_teachers") == (1, 1)
+    assert bot.parse_quiz_callback("wrong") == (1, 2)
+    for data in ("quiz", "qz:1", "qz:1:2:3", "qz:a:1", "xx:1:2", ""):
+        assert bot.parse_quiz_callback(data) is None
+
+
+def test_callback_data_fits_telegram_limit():
+    assert len(bot.quiz_callback(2**31, 99).encode()) <= 64
+
+
+def test_questions_are_ordered_and_linked(tenant):
+    quiz = tenant.quiz
+    assert len(quiz) == 2
+    assert quiz.first_id == 1
+    assert quiz.questions[1].next_id == 2
+    assert quiz.questions[2].next_id is None
+    assert quiz.questions[1].correct == frozenset({0, 1})
+
+
+def test_answering_in_order_unlocks_after_last_question(tenant):
+    tap(7, "quiz")
+    replies = tap(7, bot.quiz_callback(1, 0))
+    assert "Who is it for?" in replies[0]
+    assert not unlocked(7)
+    replies = tap(7, bot.quiz_callback(2, 0))
+    assert "Reward unlocked" in replies[0]
+    assert unlocked(7)
+    assert 7 not in tenant.quiz_progress
+    assert attempts(tenant) == [(7, 1, 0, 1), (7, 2, 0, 1)]
+
+
+def test_last_question_cannot_be_answered_first(tenant):
+    tap(7, "quiz")
+    replies = tap(7, bot.quiz_callback(2, 0))
+    assert "answer this question first" in replies[0]
+    assert "What are the songs mainly about?" in replies[1]
+    assert not unlocked(7)
+    assert attempts(tenant) == []
+
+
+def test_user_without_progress_starts_at_first_question(tenant):
+    replies = tap(7, bot.quiz_callback(2, 0))
+    assert "answer this question first" in replies[0]
+    assert not unlocked(7)
+    # Old single-question keyboards still answer question 1
+    replies = tap(7, "q1_mama")
+    assert "Who is it for?" in replies[0]
+
+
+def test_wrong_answer_keeps_user_on_question(tenant):
+    tap(7, "quiz")
+    assert "Incorrect" in tap(7, bot.quiz_callback(1, 2))[0]
+    assert "answer this question first" in tap(7, bot.quiz_callback(2, 0))[0]
+    tap(7, bot.quiz_callback(1, 1))
+    assert tenant.quiz_progress[7] == 2
+
+
+def test_out_of_range_option_is_rejected_unrecorded(tenant):
+    tap(7, "quiz")
+    for data in (bot.quiz_callback(1, 3), bot.quiz_callback(1, -1), bot.quiz_callback(99, 0)):
+        assert "expired" in tap(7, data)[0]
+    assert tenant.quiz_progress[7] == 1
+    assert attempts(tenant) == []
+
+
+def test_seeded_question_uses_tenant_songs(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "STATE", bot.MemoryStateBackend())
+    songs = {"a": {"title": "Song A", "url": "https://example.com/a"}}
+    tenant = bot.Tenant("other", bot.BOT_TOKEN, [1], songs, str(tmp_path / "other.db"))
+    token = bot.CURRENT_TENANT.set(tenant)
+    try:
+        bot.migrate_db()
+        bot.migrate_db()  # already current: nothing seeded twice
+        bot.load_quiz()
+        tenant.attempts.close()
+    finally:
+        bot.CURRENT_TENANT.reset(token)
+    assert len(tenant.quiz) == 1
+    question = tenant.quiz.questions[tenant.quiz.first_id]
+    assert question.options == ["Song A", bot.QUIZ_DECOY]
+    assert question.correct == frozenset({0})
+
+
+def test_question_without_correct_option_is_skipped(tenant):
+    conn = sqlite3.connect(tenant.db_file)
+    conn.executescript("""
+        INSERT INTO quiz_questions (id, song_key, position, prompt) VALUES (3, 'song2', 2, 'Unanswerable');
+        INSERT INTO quiz_options (question_id, position, label, correct) VALUES (3, 0, 'Nope', 0);
+    """)
+    conn.close()
+    bot.load_quiz()
+    assert list(tenant.quiz.questions) == [1, 2]
+    assert tenant.quiz.questions[2].next_id is None
+
+
+def test_readme_recipe_adds_question_with_all_options(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "STATE", bot.MemoryStateBackend())
+    tenant = bot.Tenant("default", bot.BOT_TOKEN, [1], bot.SONGS, str(tmp_path / "bot.db"))
+    token = bot.CURRENT_TENANT.set(tenant)
+    try:
+        bot.migrate_db()
+    finally:
+        bot.CURRENT_TENANT.reset(token)
+    with open(os.path.join(os.path.dirname(bot.__file__), "README.md"), encoding="utf-8") as f:
+        recipe = f.read().split("```sql", 1)[1].split("```", 1)[0]
+    conn = sqlite3.connect(tenant.db_file)
+    conn.executescript(recipe)
+    question_id = conn.execute("SELECT MAX(id) FROM quiz_questions").fetchone()[0]
+    options = conn.execute("SELECT question_id, position FROM quiz_options WHERE question_id > 1").fetchall()
+    conn.close()
+    assert options == [(question_id, 0), (question_id, 1)]
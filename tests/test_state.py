@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import bot
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return bot.MemoryStateBackend()
+    return bot.SqliteStateBackend(str(tmp_path / "state.db"))
+
+
+def test_cooldown_blocks_until_ttl_passes(backend):
+    assert backend.try_acquire("cooldown:1", 0.2)
+    assert not backend.try_acquire("cooldown:1", 0.2)
+    assert backend.try_acquire("cooldown:2", 0.2)
+    time.sleep(0.25)
+    assert backend.try_acquire("cooldown:1", 0.2)
+
+
+def test_counters(backend):
+    assert backend.get("users:0") == 0
+    assert backend.incr("users:0") == 1
+    assert backend.incr("users:0") == 2
+    assert backend.get("users:0") == 2
+    assert backend.get("users:1") == 0
+
+
+def test_queue_is_fifo_per_name(backend):
+    assert backend.pop("broadcasts") is None
+    backend.push("broadcasts", {"link": "a"})
+    backend.push("other", {"link": "x"})
+    backend.push("broadcasts", {"link": "b"})
+    assert backend.pop("broadcasts") == {"link": "a"}
+    assert backend.pop("broadcasts") == {"link": "b"}
+    assert backend.pop("broadcasts") is None
+    assert backend.pop("other") == {"link": "x"}
+
+
+def test_sqlite_cooldown_is_shared_between_connections(tmp_path):
+    first = bot.SqliteStateBackend(str(tmp_path / "state.db"))
+    second = bot.SqliteStateBackend(str(tmp_path / "state.db"))
+    assert first.try_acquire("default:cooldown:7", 0.2)
+    assert not second.try_acquire("default:cooldown:7", 0.2)
+    time.sleep(0.25)
+    assert second.try_acquire("default:cooldown:7", 0.2)
+    assert not first.try_acquire("default:cooldown:7", 0.2)
+
+
+def acquire(path, key):
+    return bot.SqliteStateBackend(path).try_acquire(key, 60)
+
+
+def test_sqlite_cooldown_upsert_admits_one_process(tmp_path):
+    path = str(tmp_path / "state.db")
+    bot.SqliteStateBackend(path)  # create the tables before the race
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        results = pool.starmap(acquire, [(path, "default:cooldown:7")] * 8)
+    assert results.count(True) == 1
+
+
+def test_sqlite_pop_hands_each_item_to_one_consumer(tmp_path):
+    first = bot.SqliteStateBackend(str(tmp_path / "state.db"))
+    second = bot.SqliteStateBackend(str(tmp_path / "state.db"))
+    for i in range(4):
+        first.push("broadcasts", i)
+    popped = [first.pop("broadcasts"), second.pop("broadcasts"), second.pop("broadcasts"), first.pop("broadcasts")]
+    assert popped == [0, 1, 2, 3]
+    assert first.pop("broadcasts") is None
+
+
+def test_cached_reloads_after_another_process_invalidates(processes):
+    first, second = processes
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    with first.active():
+        assert bot.cached("groups", load) == 1
+        assert bot.cached("groups", load) == 1
+    with second.active():
+        bot.invalidate("groups")
+    with first.active():
+        assert bot.cached("groups", load) == 2
+
+
+def test_group_registered_by_another_process_is_seen(processes):
+    first, second = processes
+    with first.active():
+        assert bot.get_approved_groups() == []
+    with second.active():
+        bot.register_group(-100, 1, "Fans")
+    with first.active():
+        assert bot.get_approved_groups() == [(-100, "Fans", None)]
+
+
+def test_forget_user_keeps_own_cache_and_flushes_others(processes):
+    first, second = processes
+    with first.active():
+        bot.get_user(7)
+        bot.get_user(9)  # same shard as 7 with two workers
+        bot.unlock_reward(7)
+        # Our own write: 7 is reloaded, 9 stays cached
+        assert 9 in first.tenant.users
+        assert bot.get_user(7)[1] == 1
+    with second.active():
+        bot.unlock_reward(9)
+    with first.active():
+        assert bot.get_user(9)[1] == 1
+        assert 7 not in first.tenant.users
+
+
+def test_new_user_refreshes_leaderboard(processes):
+    first, second = processes
+    with first.active():
+        assert bot.get_leaderboard() == []
+    with second.active():
+        bot.get_user(5)
+    with first.active():
+        assert [row[0] for row in bot.get_leaderboard()] == [5]
+
+
+def test_single_process_start_does_not_import_multiprocessing():
+    code = "import sys, bot; print(any(m.startswith('multiprocessing') for m in sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(bot.__file__), capture_output=True, text=True, check=True,
+    ).stdout
+    assert output.strip() == "False"